@@ -1,192 +1,328 @@
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
+import atexit
 import logging
+import operator
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import lru_cache, partial
+from numba import njit, prange, vectorize
 
 
-# Set up logging
-logging.basicConfig(filename='trail_simulation.log', level=logging.INFO,
+# Set up logging (per-event detail only when DEBUG_SIMULATION is set)
+logging.basicConfig(filename='trail_simulation.log',
+                   level=logging.INFO if os.environ.get("DEBUG_SIMULATION") else logging.WARNING,
                    format='%(asctime)s - %(levelname)s - %(message)s')
+LOG_EVERY = 0  # Log cleanup/maintenance events on every Nth day (0 = disabled)
 
 
 # Simulation parameters
 days = 365  # Number of days to simulate
+n_trails = 1  # Number of trails simulated side by side
 daily_tourists_mean = 11000  # Average tourists per day
 daily_tourists_std = 200  # Standard deviation for randomness
-litter_per_tourist = 0.01  # Litter produced per tourist in kg
+litter_per_tourist = np.float32(0.01)  # Litter produced per tourist in kg
+EXPORT_CSV = False  # Also write daily results as CSV alongside the Parquet files
+
+
+# Result files are written in the background so the next scenario can start computing
+_io_pool = ThreadPoolExecutor(max_workers=2)
+_pending_writes = set()  # In-flight writes, plus failed ones not yet re-raised
+_last_write = {}  # path -> latest write to it that is still in flight
+_pending_lock = threading.Lock()
+atexit.register(_io_pool.shutdown)  # Waits for in-flight writes at program exit
 
 
-# Generate daily tourists with randomness
-np.random.seed(42)  # For reproducibility
-daily_tourists = np.random.normal(daily_tourists_mean, daily_tourists_std, days)
-daily_tourists = np.clip(daily_tourists, 50, None)  # Ensure minimum of 50 tourists
+def _write_file(write, path, previous, kwargs):
+   """Write path through a temp file, once any earlier write to it has finished"""
+   # The pool's queue is FIFO, so previous is already running or done: no deadlock
+   if previous is not None:
+       wait([previous])
+   tmp_path = f"{path}.tmp"
+   write(tmp_path, **kwargs)
+   os.replace(tmp_path, path)  # Readers only ever see a complete file
 
 
+def _write_done(path, future):
+   """Drop a finished write; log and keep failures so _drain_writes re-raises them"""
+   failed = future.exception() is not None
+   with _pending_lock:
+       if _last_write.get(path) is future:
+           del _last_write[path]
+       if not failed:
+           _pending_writes.discard(future)
+   if failed:
+       logging.error("Background write to %s failed: %s", path, future.exception())
+
+
+def _submit_write(write, path, **kwargs):
+   """Run write(path, **kwargs) on the background pool; writes to one path land in call order"""
+   with _pending_lock:
+       future = _io_pool.submit(_write_file, write, path, _last_write.get(path), kwargs)
+       _last_write[path] = future
+       _pending_writes.add(future)
+   future.add_done_callback(partial(_write_done, path))
 
 
-def run_baseline_simulation():
-   """Run baseline scenario with quality protection"""
-   logging.info("Starting baseline scenario simulation")
-
-
-   # Baseline parameters
-   clean_up_efficiency = 0.7
-   clean_up_frequency = 7  # Weekly cleanups
-   erosion_rate = 0.0001
-   maintenance_frequency = 30  # Monthly maintenance
-   maintenance_improvement = 10  # 10% quality boost
-   min_quality = 1  # Minimum quality threshold (
-
-
-   # Initialize arrays
-   total_litter = np.zeros(days)
-   trail_quality = np.zeros(days)
-   trail_quality[0] = 100  # Start at 100% quality
-
-
-   # Data storage
-   data = {
-       "Day": [], "Tourists": [], "Litter_Added": [],
-       "Litter_Removed": [], "Total_Litter": [],
-       "Trail_Degradation": [], "Trail_Maintenance": [],
-       "Trail_Quality": []
-   }
-
-
-   for day in range(days):
-       tourists_today = daily_tourists[day]
-
-
-       # Litter calculation
-       litter_added = tourists_today * litter_per_tourist
-       total_litter[day] = total_litter[day - 1] + litter_added if day > 0 else litter_added
-
-
-       # Cleanup
-       litter_removed = 0
-       if day % clean_up_frequency == 0:
-           litter_removed = total_litter[day] * clean_up_efficiency
-           total_litter[day] -= litter_removed
-           logging.info(f"Day {day + 1}: Removed {litter_removed:.2f}kg litter")
+def _drain_writes():
+   """Wait for every pending write, re-raising the first failure"""
+   with _pending_lock:
+       futures = list(_pending_writes)
+       _pending_writes.clear()
+   for future in futures:
+       future.result()
 
 
-       # Quality calculation with protection
-       degradation = tourists_today * erosion_rate
-       new_quality = (trail_quality[day - 1] if day > 0 else 100) - degradation
-       trail_quality[day] = max(new_quality, min_quality)
+# Generate daily tourists for every trail, in place in one (days, n_trails) float32 buffer
+rng = np.random.default_rng(42)  # For reproducibility
+daily_tourists = np.empty((days, n_trails), dtype=np.float32)
+rng.standard_normal(dtype=np.float32, out=daily_tourists)
+np.multiply(daily_tourists, daily_tourists_std, out=daily_tourists)
+np.add(daily_tourists, daily_tourists_mean, out=daily_tourists)
+np.maximum(daily_tourists, 50.0, out=daily_tourists)  # Ensure minimum of 50 tourists
 
 
-       # Maintenance
-       maintenance = 0
-       if day % maintenance_frequency == 0:
-           maintenance = maintenance_improvement
-           trail_quality[day] = min(trail_quality[day] + maintenance, 100)
-           logging.info(f"Day {day + 1}: Maintenance improved quality to {trail_quality[day]:.1f}%")
+@vectorize(["float32(float32, float32)"], cache=True)
+def _tourists_to_litter(tourists, rate):
+   """Litter left behind by a day's tourists"""
+   return tourists * rate
+
+
+# Daily litter, computed once for every scenario
+daily_litter = _tourists_to_litter(daily_tourists, litter_per_tourist)
+
 
 
-       # Store data
-       data["Day"].append(day + 1)
-       data["Tourists"].append(tourists_today)
-       data["Litter_Added"].append(litter_added)
-       data["Litter_Removed"].append(litter_removed)
-       data["Total_Litter"].append(total_litter[day])
-       data["Trail_Degradation"].append(degradation)
-       data["Trail_Maintenance"].append(maintenance)
-       data["Trail_Quality"].append(trail_quality[day])
 
+# Explicit signature: compiled eagerly at import (and cached) instead of on first call
+@njit("UniTuple(float32[:, ::1], 5)(float32[:, ::1], float32[:, ::1], float32[::1], int64[::1], "
+      "float32[::1], int64[::1], float32[::1], float32[::1])",
+      cache=True, fastmath=True)
+def _simulate(daily_tourists, daily_litter, clean_up_efficiency, clean_up_frequency, erosion_rate,
+              maintenance_frequency, maintenance_improvement, min_quality):
+   """Step every trail through each day and return the (day, trail) result arrays"""
+   days, n_trails = daily_tourists.shape
+   # Row 0 is a sentinel holding the starting state (no litter, 100% quality),
+   # so day d always reads day d - 1 without a first-day branch
+   total_litter = np.zeros((days + 1, n_trails), dtype=np.float32)
+   trail_quality = np.empty((days + 1, n_trails), dtype=np.float32)
+   litter_removed_arr = np.empty((days + 1, n_trails), dtype=np.float32)
+   degradation_arr = np.empty((days + 1, n_trails), dtype=np.float32)
+   maintenance_arr = np.empty((days + 1, n_trails), dtype=np.float32)
+   full_quality = np.float32(100.0)
+   trail_quality[0] = full_quality
 
-   df = pd.DataFrame(data)
-   df.to_csv("baseline_results.csv", index=False)
-   logging.info(
-       f"Baseline simulation complete. Quality range: {df['Trail_Quality'].min():.1f}% to {df['Trail_Quality'].max():.1f}%")
-   return df["Total_Litter"].mean(), df["Trail_Quality"].mean(), df
+
+   # Cleanup and maintenance schedules, known before the loop starts
+   # (the first simulated day is row 1 and always gets both)
+   cleanup_days = np.zeros((days + 1, n_trails), dtype=np.bool_)
+   maintenance_days = np.zeros((days + 1, n_trails), dtype=np.bool_)
+   for trail in range(n_trails):
+       cleanup_days[1::clean_up_frequency[trail], trail] = True
+       maintenance_days[1::maintenance_frequency[trail], trail] = True
+
+
+   for day in range(1, days + 1):
+       # Trails are the contiguous axis, so this inner loop is the one LLVM vectorizes
+       for trail in range(n_trails):
+           tourists_today = daily_tourists[day - 1, trail]
+
+
+           # Litter calculation
+           litter_added = daily_litter[day - 1, trail]
+           total_litter[day, trail] = total_litter[day - 1, trail] + litter_added
+
+
+           # Cleanup
+           litter_removed = np.float32(0.0)
+           if cleanup_days[day, trail]:
+               litter_removed = total_litter[day, trail] * clean_up_efficiency[trail]
+               total_litter[day, trail] -= litter_removed
+
+
+           # Quality calculation with protection
+           degradation = tourists_today * erosion_rate[trail]
+           quality = trail_quality[day - 1, trail] - degradation
+           if quality < min_quality[trail]:
+               quality = min_quality[trail]
 
 
+           # Maintenance
+           maintenance = np.float32(0.0)
+           if maintenance_days[day, trail]:
+               maintenance = maintenance_improvement[trail]
+               quality += maintenance
+               if quality > full_quality:
+                   quality = full_quality
+           trail_quality[day, trail] = quality
 
 
-def run_alternative_simulation():
-   """Run alternative scenario with enhanced parameters"""
-   logging.info("Starting alternative scenario simulation")
-
-
-   # Enhanced parameters
-   clean_up_efficiency = 0.9  # 90% efficiency
-   clean_up_frequency = 3  # Every 3 days
-   erosion_rate = 0.0001
-   maintenance_frequency = 21  # Every 21 days
-   maintenance_improvement = 15  # 15% boosts
-   min_quality = 1  # Minimum quality threshold
+           # Store data
+           litter_removed_arr[day, trail] = litter_removed
+           degradation_arr[day, trail] = degradation
+           maintenance_arr[day, trail] = maintenance
 
 
-   # Initialize arrays
-   total_litter = np.zeros(days)
-   trail_quality = np.zeros(days)
-   trail_quality[0] = 100
+   return (total_litter[1:], trail_quality[1:], litter_removed_arr[1:],
+           degradation_arr[1:], maintenance_arr[1:])
 
 
-   # Data storage
-   data = {
-       "Day": [], "Tourists": [], "Litter_Added": [],
-       "Litter_Removed": [], "Total_Litter": [],
-       "Trail_Degradation": [], "Trail_Maintenance": [],
-       "Trail_Quality": []
-   }
 
 
-   for day in range(days):
-       tourists_today = daily_tourists[day]
+@njit(parallel=True, cache=True)
+def sweep(param_grid, daily_tourists, daily_litter):
+   """Return park-wide mean litter and mean quality for each row of a (K, 6) parameter grid"""
+   # Grid columns: clean_up_efficiency, clean_up_frequency, erosion_rate,
+   # maintenance_frequency, maintenance_improvement, min_quality.
+   # Each row is applied to every trail in the tourist arrays.
+   n = param_grid.shape[0]
+   n_trails = daily_tourists.shape[1]
+   out = np.empty((n, 2))
+   for i in prange(n):
+       total_litter, trail_quality, _, _, _ = _simulate(
+           daily_tourists, daily_litter,
+           np.full(n_trails, param_grid[i, 0], dtype=np.float32),
+           np.full(n_trails, int(param_grid[i, 1]), dtype=np.int64),
+           np.full(n_trails, param_grid[i, 2], dtype=np.float32),
+           np.full(n_trails, int(param_grid[i, 3]), dtype=np.int64),
+           np.full(n_trails, param_grid[i, 4], dtype=np.float32),
+           np.full(n_trails, param_grid[i, 5], dtype=np.float32))
+       out[i, 0] = total_litter.mean()
+       out[i, 1] = trail_quality.mean()
+   return out
+
+
+
+
+# One record per simulated (day, trail), in day-major order
+RESULTS_DTYPE = np.dtype([
+   ("Day", "i4"), ("Trail", "i4"), ("Tourists", "f4"), ("Litter_Added", "f4"),
+   ("Litter_Removed", "f4"), ("Total_Litter", "f4"),
+   ("Trail_Degradation", "f4"), ("Trail_Maintenance", "f4"),
+   ("Trail_Quality", "f4")
+])
+
+
+
+
+@lru_cache(maxsize=512)
+def _cached_simulate(params, inputs_hash):
+   """Simulate one parameter tuple and return (mean litter, mean quality, results)"""
+   # inputs_hash only keys the cache on the current tourist/litter series, which
+   # are read from the module globals below
+   # Each entry of params is a tuple with one value per trail
+   (clean_up_efficiency, clean_up_frequency, erosion_rate,
+    maintenance_frequency, maintenance_improvement, min_quality) = params
+   (total_litter, trail_quality, litter_removed,
+    degradation, maintenance) = _simulate(daily_tourists, daily_litter,
+                                          np.array(clean_up_efficiency, dtype=np.float32),
+                                          np.array(clean_up_frequency, dtype=np.int64),
+                                          np.array(erosion_rate, dtype=np.float32),
+                                          np.array(maintenance_frequency, dtype=np.int64),
+                                          np.array(maintenance_improvement, dtype=np.float32),
+                                          np.array(min_quality, dtype=np.float32))
+   # Summaries straight from the kernel's contiguous arrays
+   mean_litter, mean_quality = total_litter.mean(), trail_quality.mean()
 
 
-       # Litter calculation
-       litter_added = tourists_today * litter_per_tourist
-       total_litter[day] = total_litter[day - 1] + litter_added if day > 0 else litter_added
+   # Flatten (day, trail) into long format
+   results = np.empty(days * n_trails, dtype=RESULTS_DTYPE)
+   results["Day"] = np.repeat(np.arange(1, days + 1), n_trails)
+   results["Trail"] = np.tile(np.arange(1, n_trails + 1), days)
+   results["Tourists"] = daily_tourists.ravel()
+   results["Litter_Added"] = daily_litter.ravel()
+   results["Litter_Removed"] = litter_removed.ravel()
+   results["Total_Litter"] = total_litter.ravel()
+   results["Trail_Degradation"] = degradation.ravel()
+   results["Trail_Maintenance"] = maintenance.ravel()
+   results["Trail_Quality"] = trail_quality.ravel()
+   results.flags.writeable = False  # Shared by every caller that hits the cache
+   return mean_litter, mean_quality, results
 
 
-       # Cleanup
-       litter_removed = 0
-       if day % clean_up_frequency == 0:
-           litter_removed = total_litter[day] * clean_up_efficiency
-           total_litter[day] -= litter_removed
-           logging.info(f"Day {day + 1}: Removed {litter_removed:.2f}kg litter (alternative)")
 
 
-       # Quality calculation with protection
-       degradation = tourists_today * erosion_rate
-       new_quality = (trail_quality[day - 1] if day > 0 else 100) - degradation
-       trail_quality[day] = max(new_quality, min_quality)
+def _per_trail(value, kind):
+   """Broadcast a scalar or per-trail sequence to a hashable tuple of n_trails values"""
+   return tuple(kind(v) for v in np.broadcast_to(value, (n_trails,)))
+
+
+
+
+def _run_scenario(scenario, clean_up_efficiency, clean_up_frequency, erosion_rate,
+                 maintenance_frequency, maintenance_improvement, min_quality):
+   """Simulate one parameter set, save its daily results and return the averages"""
+   # Parameters may be scalars (same for every trail) or one value per trail.
+   # Normalise types so equal parameter sets share a cache entry, and every
+   # scenario shares one compiled specialization. Frequencies go through
+   # operator.index so a value like 7.5 raises instead of quietly becoming 7
+   params = (_per_trail(clean_up_efficiency, float), _per_trail(clean_up_frequency, operator.index),
+             _per_trail(erosion_rate, float), _per_trail(maintenance_frequency, operator.index),
+             _per_trail(maintenance_improvement, float), _per_trail(min_quality, float))
+   # Key on the series the kernel reads at call time, so reassigning or editing
+   # them in place never returns stale results
+   inputs_hash = hash((daily_tourists.tobytes(), daily_litter.tobytes()))
+   mean_litter, mean_quality, results = _cached_simulate(params, inputs_hash)
+
+
+   if LOG_EVERY:
+       litter_removed = results["Litter_Removed"].reshape(days, n_trails)
+       trail_quality = results["Trail_Quality"].reshape(days, n_trails)
+       for trail in range(n_trails):
+           for day in range(0, days, params[1][trail]):
+               if day % LOG_EVERY == 0:
+                   logging.info("Day %d: Removed %.2fkg litter on trail %d (%s)",
+                                day + 1, litter_removed[day, trail], trail + 1, scenario)
+           for day in range(0, days, params[3][trail]):
+               if day % LOG_EVERY == 0:
+                   logging.info("Day %d: Maintenance improved trail %d quality to %.1f%% (%s)",
+                                day + 1, trail + 1, trail_quality[day, trail], scenario)
+
+
+   # pandas is only needed to write the files and the log summary
+   df = pd.DataFrame(results)
+   # Safe to hand off: df is never modified after this point
+   _submit_write(df.to_parquet, f"{scenario}_results.parquet", compression="snappy", index=False)
+   if EXPORT_CSV:
+       _submit_write(df.to_csv, f"{scenario}_results.csv", index=False)
+   if logging.getLogger().isEnabledFor(logging.INFO):
+       logging.info("%s simulation complete:\n%s", scenario.capitalize(), df.describe().to_string())
+   return mean_litter, mean_quality, results
+
+
 
 
-       # Maintenance
-       maintenance = 0
-       if day % maintenance_frequency == 0:
-           maintenance = maintenance_improvement
-           trail_quality[day] = min(trail_quality[day] + maintenance, 100)
-           logging.info(f"Day {day + 1}: Maintenance improved quality to {trail_quality[day]:.1f}% (alternative)")
+def run_baseline_simulation():
+   """Run baseline scenario with quality protection"""
+   return _run_scenario("baseline",
+                        clean_up_efficiency=0.7,
+                        clean_up_frequency=7,  # Weekly cleanups
+                        erosion_rate=0.0001,
+                        maintenance_frequency=30,  # Monthly maintenance
+                        maintenance_improvement=10,  # 10% quality boost
+                        min_quality=1)  # Minimum quality threshold
 
 
-       # Store data
-       data["Day"].append(day + 1)
-       data["Tourists"].append(tourists_today)
-       data["Litter_Added"].append(litter_added)
-       data["Litter_Removed"].append(litter_removed)
-       data["Total_Litter"].append(total_litter[day])
-       data["Trail_Degradation"].append(degradation)
-       data["Trail_Maintenance"].append(maintenance)
-       data["Trail_Quality"].append(trail_quality[day])
 
 
-   df = pd.DataFrame(data)
-   df.to_csv("alternative_results.csv", index=False)
-   logging.info(
-       f"Alternative simulation complete. Quality range: {df['Trail_Quality'].min():.1f}% to {df['Trail_Quality'].max():.1f}%")
-   return df["Total_Litter"].mean(), df["Trail_Quality"].mean(), df
+def run_alternative_simulation():
+   """Run alternative scenario with enhanced parameters"""
+   return _run_scenario("alternative",
+                        clean_up_efficiency=0.9,  # 90% efficiency
+                        clean_up_frequency=3,  # Every 3 days
+                        erosion_rate=0.0001,
+                        maintenance_frequency=21,  # Every 21 days
+                        maintenance_improvement=15,  # 15% boosts
+                        min_quality=1)  # Minimum quality threshold
 
 
 
 
 # Run simulations
-baseline_litter, baseline_quality, df_baseline = run_baseline_simulation()
-alt_litter, alt_quality, df_alt = run_alternative_simulation()
+baseline_litter, baseline_quality, results_baseline = run_baseline_simulation()
+alt_litter, alt_quality, results_alt = run_alternative_simulation()
 
 
 # Create and save comparison
@@ -201,49 +337,66 @@ comparison.to_csv("scenario_comparison.csv", index=False)
 
 
 # Generate visualizations
-def create_comparison_plot():
-   plt.figure(figsize=(14, 6))
+_comparison_plot = None  # (fig, panels), built on first use and then only updated
+
+
+def _build_comparison_plot(scenarios):
+   """Create the figure, bars and value labels once"""
+   fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6))
+   panels = []
+   for ax, title, ylabel, label_format in (
+           (ax1, "Average Litter Accumulation", "Kilograms of Litter", "{:.1f} kg"),
+           (ax2, "Average Trail Quality", "Quality Score (%)", "{:.1f}%")):
+       bars = ax.bar(scenarios, np.zeros(len(scenarios)),
+                     color=['#1f77b4', '#2ca02c'], alpha=0.7)
+       ax.set_title(title)
+       ax.set_ylabel(ylabel)
+       labels = [ax.text(bar.get_x() + bar.get_width() / 2., 0, "", ha='center', va='bottom')
+                 for bar in bars]
+       panels.append((ax, bars, labels, label_format))
+   ax2.set_ylim(0, 100)
+   return fig, panels
+
+
+
+
+def create_comparison_plot(comparison):
+   """Update the bar heights and labels in place and save the figure"""
+   global _comparison_plot
+   first_draw = _comparison_plot is None
+   if first_draw:
+       _comparison_plot = _build_comparison_plot(comparison["Scenario"])
+   fig, panels = _comparison_plot
 
 
-   # Litter comparison
-   plt.subplot(1, 2, 1)
-   bars = plt.bar(comparison["Scenario"], comparison["Avg_Litter_kg"],
-                  color=['#1f77b4', '#2ca02c'], alpha=0.7)
-   plt.title("Average Litter Accumulation")
-   plt.ylabel("Kilograms of Litter")
-   plt.ylim(0, max(comparison["Avg_Litter_kg"]) * 1.2)
-   for bar in bars:
-       height = bar.get_height()
-       plt.text(bar.get_x() + bar.get_width() / 2., height,
-                f'{height:.1f} kg', ha='center', va='bottom')
+   for (ax, bars, labels, label_format), column in zip(panels, ("Avg_Litter_kg", "Avg_Quality_pct")):
+       for bar, label, height in zip(bars, labels, comparison[column]):
+           bar.set_height(height)
+           label.set_y(height)
+           label.set_text(label_format.format(height))
+   panels[0][0].set_ylim(0, max(comparison["Avg_Litter_kg"]) * 1.2)
 
 
-   # Quality comparison
-   plt.subplot(1, 2, 2)
-   bars = plt.bar(comparison["Scenario"], comparison["Avg_Quality_pct"],
-                  color=['#1f77b4', '#2ca02c'], alpha=0.7)
-   plt.title("Average Trail Quality")
-   plt.ylabel("Quality Score (%)")
-   plt.ylim(0, 100)
-   for bar in bars:
-       height = bar.get_height()
-       plt.text(bar.get_x() + bar.get_width() / 2., height,
-                f'{height:.1f}%', ha='center', va='bottom')
+   if first_draw:
+       fig.tight_layout()
+   fig.canvas.draw_idle()
+   fig.savefig("scenario_comparison.png")
+   if __name__ == "__main__":
+       plt.show()
 
 
-   plt.tight_layout()
-   plt.savefig("scenario_comparison.png")
-   plt.show()
 
 
+create_comparison_plot(comparison)
 
 
-create_comparison_plot()
+# Make sure the results are on disk (or the failure is raised) before reporting success
+_drain_writes()
 
 
 print("Simulation completed successfully. Results saved to:")
-print("- baseline_results.csv")
-print("- alternative_results.csv")
+print("- baseline_results.parquet")
+print("- alternative_results.parquet")
 print("- scenario_comparison.csv")
 print("- scenario_comparison.png")
 